@@ -1,11 +1,11 @@
-import json
 import os
 import sys
-import re
 
 # Add src directory to path
 sys.path.insert(0, 'src')
 
+from config_cache import is_valid_date, write_json
+
 def configure_filters():
     """Interactive filter configuration for setup."""
     print("\n" + "=" * 60)
@@ -63,7 +63,7 @@ def configure_filters():
     
     min_date = input("\nStart date (YYYY-MM-DD): ").strip()
     if min_date:
-        if re.match(r'\d{4}-\d{2}-\d{2}', min_date):
+        if is_valid_date(min_date):
             filters['min_date'] = min_date
             print(f"  ✓ Start date: {min_date}")
         else:
@@ -74,7 +74,7 @@ def configure_filters():
     
     max_date = input("End date (YYYY-MM-DD): ").strip()
     if max_date:
-        if re.match(r'\d{4}-\d{2}-\d{2}', max_date):
+        if is_valid_date(max_date):
             filters['max_date'] = max_date
             print(f"  ✓ End date: {max_date}")
         else:
@@ -99,7 +99,8 @@ def setup_config():
     PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
     CREDENTIALS_FILE = os.path.join(PROJECT_ROOT, 'credentials', 'credentials.json')
     CONFIG_FILE = os.path.join(PROJECT_ROOT, 'config.json')
-    TOKEN_FILE = os.path.join(PROJECT_ROOT, 'token.pickle')
+    TOKEN_FILE = os.path.join(PROJECT_ROOT, 'token.json')
+    LEGACY_TOKEN_FILE = os.path.join(PROJECT_ROOT, 'token.pickle')
     
     print(f"Project root: {PROJECT_ROOT}")
     print(f"Credentials path: {CREDENTIALS_FILE}")
@@ -125,19 +126,19 @@ def setup_config():
     
     print(f"\n✅ Found credentials.json at: {CREDENTIALS_FILE}")
     
-    # Clean up any corrupted token files
-    if os.path.exists('token.json'):
+    # Clean up any old token files so setup starts a fresh OAuth flow
+    if os.path.exists(TOKEN_FILE):
         try:
-            os.remove('token.json')
-            print("✅ Removed corrupted token.json")
-        except:
+            os.remove(TOKEN_FILE)
+            print("✅ Removed old token.json")
+        except OSError:
             pass
     
-    if os.path.exists(TOKEN_FILE):
+    if os.path.exists(LEGACY_TOKEN_FILE):
         try:
-            os.remove(TOKEN_FILE)
+            os.remove(LEGACY_TOKEN_FILE)
             print("✅ Removed old token.pickle")
-        except:
+        except OSError:
             pass
     
     # Import after checking prerequisites
@@ -190,8 +191,7 @@ def setup_config():
                 'filters': filters
             }
             
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config_data, f, indent=2)
+            write_json(CONFIG_FILE, config_data)
                 
             
     elif choice == '2':
@@ -201,7 +201,8 @@ def setup_config():
             # Test the spreadsheet
             try:
                 result = automation.sheets_service.service.spreadsheets().get(
-                    spreadsheetId=spreadsheet_id
+                    spreadsheetId=spreadsheet_id,
+                    fields='properties.title'
                 ).execute()
                 
                 print(f"\n✅ Valid spreadsheet: {result.get('properties', {}).get('title')}")
@@ -212,8 +213,7 @@ def setup_config():
                     'filters': filters
                 }
                 
-                with open(CONFIG_FILE, 'w') as f:
-                    json.dump(config_data, f, indent=2)
+                write_json(CONFIG_FILE, config_data)
                     
                 print("✅ Configuration saved with filters!")
                 
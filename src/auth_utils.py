@@ -0,0 +1,35 @@
+import os
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.http import build_http
+
+def migrate_pickle_token(token_file):
+    """Rewrite a legacy token.pickle next to the token file as JSON."""
+    legacy_file = os.path.splitext(token_file)[0] + '.pickle'
+    if legacy_file == token_file or os.path.exists(token_file):
+        return
+    if not os.path.exists(legacy_file):
+        return
+    
+    try:
+        import pickle
+        with open(legacy_file, 'rb') as token:
+            creds = pickle.load(token)
+        with open(token_file, 'w') as token:
+            token.write(creds.to_json())
+        os.remove(legacy_file)
+        print(f"✓ Migrated token from {legacy_file} to {token_file}")
+    except Exception as e:
+        print(f"Error migrating token: {e}")
+
+def save_token(creds, token_file):
+    """Write credentials to the token file as JSON."""
+    with open(token_file, 'w') as token:
+        token.write(creds.to_json())
+
+def authorized_http(creds):
+    """Create an authorized HTTP connection for use outside the built service.
+    
+    Built on googleapiclient's build_http so it keeps the library's default
+    socket timeout.
+    """
+    return AuthorizedHttp(creds, http=build_http())
@@ -0,0 +1,68 @@
+import json
+import os
+import re
+from datetime import datetime
+
+# orjson is much faster than the stdlib encoder but optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Filter dates entered as YYYY-MM-DD
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# Last config read per path: path -> (mtime_ns, size, data)
+_CONFIG_CACHE = {}
+
+def read_json(path):
+    """Read a JSON file."""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_json(path, data, indent=True):
+    """Write data to a JSON file, atomically replacing any existing file.
+    
+    Args:
+        path: File to write
+        data: JSON-serializable data
+        indent: Use two-space indentation; False writes compact JSON
+    """
+    tmp_path = path + '.tmp'
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2 if indent else None)
+    # Readers never see a half-written file if the run is interrupted
+    os.replace(tmp_path, path)
+
+def get_config(path):
+    """Load a JSON config file, reusing the last result while it is unchanged.
+    
+    The file is only re-read when its modification time or size changes, so
+    repeated lookups cost a single os.stat. The returned dict is shared
+    between callers and must not be modified in place.
+    """
+    stat = os.stat(path)
+    cached = _CONFIG_CACHE.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    
+    data = read_json(path)
+    _CONFIG_CACHE[path] = (stat.st_mtime_ns, stat.st_size, data)
+    return data
+
+def is_valid_date(date_string):
+    """Check a filter date is YYYY-MM-DD and a real calendar date."""
+    if not DATE_RE.match(date_string):
+        return False
+    try:
+        datetime.strptime(date_string, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
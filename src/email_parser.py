@@ -1,15 +1,76 @@
 import base64
 import re
 import html
-from datetime import datetime
+import sys
+from email.utils import parsedate_to_datetime
 from html.parser import HTMLParser
 
+# Prefer a C-backed HTML parser when one is installed
+try:
+    from selectolax.lexbor import LexborHTMLParser as LexborParser
+except ImportError:
+    LexborParser = None
+
+try:
+    import lxml.html as lxml_html
+except ImportError:
+    lxml_html = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+IGNORE_TAGS = ['script', 'style', 'head', 'title', 'meta']
+
+# Lowercased header names read by parse_email
+_WANTED_HEADERS = frozenset(['from', 'subject', 'date'])
+
+# Patterns compiled once at import instead of on every call
+_ANGLE_RE = re.compile(r'<([^>]+)>')
+_EMAIL_RE = re.compile(r'([^\s<>"]+@[^\s<>"]+)')
+_TAG_RE = re.compile(r'<[^>]+>')
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+_SCRIPT_RE = re.compile(r'<(script|style).*?>.*?</\1>', re.DOTALL | re.IGNORECASE)
+
+# Base64 characters decoded per part when HTML isn't kept (multiples of 4).
+# The body is cut to 5000 characters, so this leaves room for whitespace
+# and markup without decoding multi-megabyte parts in full.
+_DECODE_LIMITS = {'text/plain': 64 * 1024, 'text/html': 512 * 1024}
+
+# Entities that cover nearly all marketing email; anything else goes
+# through the full html.unescape table
+_ENTITY_RE = re.compile(r'&(nbsp|amp|lt|gt|quot|apos|#\d+|#[xX][0-9a-fA-F]+);')
+_ANY_ENTITY_RE = re.compile(r'&(#\d+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);?')
+_ENTITY_MAP = {'nbsp': ' ', 'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+def _replace_entity(match):
+    name = match.group(1)
+    if name[0] != '#':
+        return _ENTITY_MAP[name]
+    code = int(name[2:], 16) if name[1] in 'xX' else int(name[1:])
+    # Control characters and surrogates have special rules in html.unescape
+    if 0x20 <= code < 0x7F or 0xA0 <= code < 0xD800:
+        return chr(code)
+    return match.group(0)
+
+def unescape_html(text):
+    """Decode HTML entities, using a small table before html.unescape."""
+    if '&' not in text:
+        return text
+    result = _ENTITY_RE.sub(_replace_entity, text)
+    # Rare or unterminated entities are left as-is by the fast path; decode the original
+    # so already-decoded text such as '&amp;lt;' is not decoded twice
+    if _ANY_ENTITY_RE.search(result):
+        return html.unescape(text)
+    return result
+
 class HTMLFilter(HTMLParser):
-    """Simple HTML to text converter."""
+    """Simple HTML to text converter, used when no native parser is available."""
     def __init__(self):
         super().__init__()
         self.text = []
-        self.ignore_tags = ['script', 'style', 'head', 'title', 'meta']
+        self.ignore_tags = IGNORE_TAGS
         self.current_tag = None
         
     def handle_starttag(self, tag, attrs):
@@ -32,13 +93,39 @@ class HTMLFilter(HTMLParser):
                 self.text.append(cleaned)
                 
     def get_text(self):
-        # Join text and clean up
-        result = ' '.join(self.text)
-        # Remove multiple newlines
-        result = re.sub(r'\n\s*\n', '\n', result)
-        # Remove multiple spaces
-        result = re.sub(r'\s+', ' ', result)
-        return result.strip()
+        # Join text and collapse all whitespace runs to single spaces
+        return ' '.join(' '.join(self.text).split())
+
+# Below this many keywords plain substring checks beat building an automaton
+AUTOMATON_MIN_KEYWORDS = 3
+
+class KeywordMatcher:
+    """Case-insensitive matcher for a fixed set of keywords.
+    
+    With pyahocorasick installed and enough keywords, they are compiled into
+    one automaton, so each text is scanned once however many keywords there are.
+    """
+    def __init__(self, keywords):
+        self.keywords = [(k.lower(), k) for k in keywords if k]
+        self._automaton = None
+        if ahocorasick is not None and len(self.keywords) >= AUTOMATON_MIN_KEYWORDS:
+            self._automaton = ahocorasick.Automaton()
+            for lowered, keyword in self.keywords:
+                self._automaton.add_word(lowered, keyword)
+            self._automaton.make_automaton()
+    
+    def __bool__(self):
+        return bool(self.keywords)
+    
+    def search(self, text_lower):
+        """Return the first keyword found in lowercased text, or None."""
+        if self._automaton is not None:
+            hit = next(self._automaton.iter(text_lower), None)
+            return hit[1] if hit is not None else None
+        for lowered, keyword in self.keywords:
+            if lowered in text_lower:
+                return keyword
+        return None
 
 class EmailParser:
     @staticmethod
@@ -54,34 +141,63 @@ class EmailParser:
         """
         if not message:
             return None
-            
+        
+        result = EmailParser.parse_headers(message)
+        result.update(EmailParser.parse_body(message, include_html))
+        return result
+    
+    @staticmethod
+    def parse_headers(message):
+        """Parse id, sender, subject and date without touching the body.
+        
+        This is cheap enough to run before filtering, so the body only
+        has to be decoded for emails that pass.
+        """
         # Extract headers
         headers = message['payload']['headers']
         
-        # Initialize variables
-        from_email = ''
-        subject = ''
-        date_received = ''
-        
-        # Parse headers
-        for header in headers:
-            name = header['name'].lower()
-            if name == 'from':
-                from_email = header['value']
-                # Extract just email if format is "Name <email>"
-                match = re.search(r'<([^>]+)>', from_email)
-                if match:
-                    from_email = match.group(1)
-                else:
-                    # Just get the email part if it's simple
-                    from_email = from_email.split()[-1] if '@' in from_email else from_email
-            elif name == 'subject':
-                subject = header['value']
-            elif name == 'date':
-                date_received = header['value']
+        # Keep only the headers we use; later duplicates win as before
+        hdrs = {
+            header['name'].lower(): header['value']
+            for header in headers
+            if header['name'].lower() in _WANTED_HEADERS
+        }
+        subject = hdrs.get('subject', '')
+        
+        # Extract just email if format is "Name <email>"
+        from_email = hdrs.get('from', '')
+        match = _ANGLE_RE.search(from_email) or _EMAIL_RE.search(from_email)
+        if match:
+            from_email = match.group(1)
+        # Newsletters repeat the same sender across a run; share one string
+        from_email = sys.intern(from_email)
+        
+        subject = subject[:200]  # Limit subject length
+        
+        date_string = hdrs.get('date', '')
+        date_value = EmailParser.parse_datetime(date_string)
         
+        return {
+            'id': message['id'],
+            'from': from_email,
+            'subject': subject,
+            'date': date_value.strftime('%Y-%m-%d %H:%M:%S') if date_value else date_string,
+            # Lowercased once for filtering and keyword scans
+            '_subject_lc': subject.lower(),
+            '_from_lc': from_email.lower(),
+            # Unix timestamp for date-range filtering, None if unparseable
+            '_ts': int(date_value.timestamp()) if date_value else None
+        }
+    
+    @staticmethod
+    def parse_body(message, include_html=False):
+        """Decode and clean the email body.
+        
+        Returns:
+            Dictionary with 'body' and, if requested, 'html_body'
+        """
         # Parse body - get both plain text and HTML
-        plain_text, html_text = EmailParser.get_email_bodies(message['payload'])
+        plain_text, html_text = EmailParser.get_email_bodies(message['payload'], include_html)
         
         # Convert HTML to text if plain text is empty or poor
         if not plain_text and html_text:
@@ -91,17 +207,9 @@ class EmailParser:
             plain_text = EmailParser.html_to_text(html_text)
         
         # Clean body - remove excessive whitespace
-        plain_text = re.sub(r'\s+', ' ', plain_text).strip() if plain_text else ""
+        plain_text = ' '.join(plain_text.split()) if plain_text else ""
         
-        # Convert date to readable format
-        date_received = EmailParser.parse_date(date_received)
-        
-        # Prepare result
         result = {
-            'id': message['id'],
-            'from': from_email,
-            'subject': subject[:200],  # Limit subject length
-            'date': date_received,
             'body': plain_text[:5000]  # Limit body length for Sheets
         }
         
@@ -112,45 +220,62 @@ class EmailParser:
         return result
     
     @staticmethod
-    def get_email_bodies(payload):
-        """Extract both plain text and HTML bodies from email payload."""
+    def get_charset(part):
+        """Return the charset declared in a part's Content-Type header."""
+        for header in part.get('headers', []):
+            if header['name'].lower() == 'content-type':
+                match = _CHARSET_RE.search(header['value'])
+                if match:
+                    return match.group(1)
+                break
+        return 'utf-8'
+    
+    @staticmethod
+    def get_email_bodies(payload, include_html=False):
+        """Extract both plain text and HTML bodies from email payload.
+        
+        Args:
+            payload: Message payload from Gmail API
+            include_html: If False, HTML parts are not decoded once a
+                usable plain text body has been found
+        """
         plain_text = ""
         html_text = ""
         
-        def extract_from_part(part):
-            nonlocal plain_text, html_text
+        # Walk the MIME tree with an explicit stack; parts are pushed in
+        # reverse so they are visited in document order
+        stack = list(reversed(payload.get('parts', []))) or [payload]
+        while stack:
+            part = stack.pop()
             mime_type = part.get('mimeType', '').lower()
             
+            if mime_type.startswith('multipart/'):
+                stack.extend(reversed(part.get('parts', [])))
+                continue
+            
+            if mime_type not in ('text/plain', 'text/html'):
+                continue
+            
+            data = part.get('body', {}).get('data')
+            if not data:
+                continue
+            
+            if not include_html:
+                # HTML is only needed as a fallback for short plain text
+                if mime_type == 'text/html' and len(plain_text) > 200:
+                    continue
+                data = data[:_DECODE_LIMITS[mime_type]]
+            
+            raw = base64.urlsafe_b64decode(data)
+            try:
+                decoded = raw.decode(EmailParser.get_charset(part), errors='ignore')
+            except LookupError:
+                decoded = raw.decode('utf-8', errors='ignore')
             if mime_type == 'text/plain':
-                if 'data' in part['body']:
-                    text = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                    if not plain_text or len(text) > len(plain_text):
-                        plain_text = text
-                        
-            elif mime_type == 'text/html':
-                if 'data' in part['body']:
-                    html = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                    if not html_text or len(html) > len(html_text):
-                        html_text = html
-                        
-            elif mime_type.startswith('multipart/'):
-                # Recursively check multipart parts
-                for subpart in part.get('parts', []):
-                    extract_from_part(subpart)
-        
-        # Check payload
-        if 'parts' in payload:
-            for part in payload['parts']:
-                extract_from_part(part)
-        else:
-            # Single part email
-            mime_type = payload.get('mimeType', '').lower()
-            if 'data' in payload.get('body', {}):
-                data = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='ignore')
-                if mime_type == 'text/plain':
-                    plain_text = data
-                elif mime_type == 'text/html':
-                    html_text = data
+                if len(decoded) > len(plain_text):
+                    plain_text = decoded
+            elif len(decoded) > len(html_text):
+                html_text = decoded
         
         return plain_text, html_text
     
@@ -161,8 +286,22 @@ class EmailParser:
             return ""
         
         try:
+            if LexborParser is not None:
+                # Lexbor decodes entities and skips ignored tags in native code
+                tree = LexborParser(html_content)
+                for tag in tree.css(','.join(IGNORE_TAGS)):
+                    tag.decompose()
+                text = tree.body.text(separator=' ') if tree.body else tree.text(separator=' ')
+                return ' '.join(text.split())
+            
+            if lxml_html is not None:
+                doc = lxml_html.fromstring(html_content)
+                for element in doc.xpath('|'.join(f'//{tag}' for tag in IGNORE_TAGS)):
+                    element.drop_tree()
+                return ' '.join(doc.text_content().split())
+            
             # First, unescape HTML entities
-            unescaped = html.unescape(html_content)
+            unescaped = unescape_html(html_content)
             
             # Use HTML parser for better conversion
             parser = HTMLFilter()
@@ -172,63 +311,61 @@ class EmailParser:
             # If parser didn't work well, fallback to regex
             if not text or len(text) < 10:
                 # Remove script and style tags
-                text = re.sub(r'<(script|style).*?>.*?</\1>', '', unescaped, flags=re.DOTALL | re.IGNORECASE)
+                text = _SCRIPT_RE.sub('', unescaped)
                 # Remove HTML tags
-                text = re.sub(r'<[^>]+>', ' ', text)
+                text = _TAG_RE.sub(' ', text)
                 # Clean up whitespace
-                text = re.sub(r'\s+', ' ', text).strip()
+                text = ' '.join(text.split())
             
             return text
         except Exception as e:
             print(f"HTML conversion error: {e}")
             # Fallback: remove tags with regex
-            text = re.sub(r'<[^>]+>', ' ', html_content)
-            return re.sub(r'\s+', ' ', text).strip()
+            text = _TAG_RE.sub(' ', html_content)
+            return ' '.join(text.split())
     
     @staticmethod
-    def parse_date(date_string):
-        """Parse date string to readable format."""
+    def parse_datetime(date_string):
+        """Parse a Date header into a datetime, or None if it can't be parsed."""
         if not date_string:
-            return ""
-            
-        try:
-            # Try multiple date formats
-            date_formats = [
-                '%a, %d %b %Y %H:%M:%S %z',
-                '%d %b %Y %H:%M:%S %z',
-                '%Y-%m-%d %H:%M:%S',
-                '%d %b %Y %H:%M:%S %z (%Z)',
-                '%Y/%m/%d %H:%M:%S'
-            ]
-            
-            # Remove timezone name if present
-            date_str_clean = date_string.split(' (')[0].split(' GMT')[0]
-            
-            for fmt in date_formats:
-                try:
-                    dt = datetime.strptime(date_str_clean, fmt)
-                    return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    continue
-        except:
-            pass  # Keep original format if parsing fails
+            return None
         
-        return date_string
+        try:
+            # Gmail Date headers are RFC 2822
+            return parsedate_to_datetime(date_string)
+        except (TypeError, ValueError, IndexError):
+            return None
     
     @staticmethod
-    def extract_keywords(text, keywords):
-        """Extract lines containing specific keywords from text."""
+    def parse_date(date_string):
+        """Parse date string to readable format."""
+        date_value = EmailParser.parse_datetime(date_string)
+        if date_value is None:
+            return date_string  # Keep original format if parsing fails
+        return date_value.strftime('%Y-%m-%d %H:%M:%S')
+    
+    @staticmethod
+    def extract_keywords(text, keywords, text_lower=None):
+        """Extract lines containing specific keywords from text.
+        
+        Args:
+            text: Text to scan
+            keywords: List of keywords, or a prebuilt KeywordMatcher to
+                reuse across many texts
+            text_lower: text.lower(), if the caller already has it
+        """
         if not text or not keywords:
             return []
         
+        matcher = keywords if isinstance(keywords, KeywordMatcher) else KeywordMatcher(keywords)
+        if text_lower is None:
+            text_lower = text.lower()
+        
         results = []
         lines = text.split('\n')
         
-        for line in lines:
-            line_lower = line.lower()
-            for keyword in keywords:
-                if keyword.lower() in line_lower:
-                    results.append(line.strip())
-                    break
+        for line, line_lower in zip(lines, text_lower.split('\n')):
+            if matcher.search(line_lower) is not None:
+                results.append(line.strip())
         
         return results
\ No newline at end of file
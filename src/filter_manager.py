@@ -1,10 +1,12 @@
-import json
+import copy
 import os
 import sys
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config_cache import get_config, is_valid_date, write_json
+
 def manage_filters():
     """Interactive filter management tool."""
     CONFIG_FILE = 'config.json'
@@ -13,8 +15,8 @@ def manage_filters():
         print("❌ config.json not found. Run setup first.")
         return
     
-    with open(CONFIG_FILE, 'r') as f:
-        config = json.load(f)
+    # Copy so edits below don't touch the shared cached config
+    config = copy.deepcopy(get_config(CONFIG_FILE))
     
     filters = config.get('filters', {'enabled': False})
     
@@ -84,7 +86,9 @@ def manage_filters():
         print(f"  End: {filters.get('max_date', 'Not set')}")
         
         min_date = input("\nNew start date (YYYY-MM-DD, empty to clear): ").strip()
-        if min_date:
+        if min_date and not is_valid_date(min_date):
+            print(f"✗ Invalid date: {min_date}, keeping previous start date")
+        elif min_date:
             filters['min_date'] = min_date
             print(f"✓ Start date: {min_date}")
         else:
@@ -92,7 +96,9 @@ def manage_filters():
             print("✓ Cleared start date")
         
         max_date = input("New end date (YYYY-MM-DD, empty to clear): ").strip()
-        if max_date:
+        if max_date and not is_valid_date(max_date):
+            print(f"✗ Invalid date: {max_date}, keeping previous end date")
+        elif max_date:
             filters['max_date'] = max_date
             print(f"✓ End date: {max_date}")
         else:
@@ -120,10 +126,11 @@ def manage_filters():
         print("❌ Invalid choice")
         return
     
-    # Save changes
+    # Save changes; a full listing is needed so older emails matching
+    # the new filters are picked up
     config['filters'] = filters
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    config.pop('last_history_id', None)
+    write_json(CONFIG_FILE, config)
     
     print(f"\n✓ Filters saved to {CONFIG_FILE}")
 
@@ -1,17 +1,72 @@
 import os
-import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from auth_utils import authorized_http, migrate_pickle_token, save_token
+from config_cache import read_json
+
+# Search used when no filters are pushed to the server
+UNREAD_QUERY = 'is:unread in:inbox'
+# Gmail accepts at most 100 sub-requests per batch HTTP call
+BATCH_SIZE = 100
+# Number of batch requests allowed in flight at once
+FETCH_CONCURRENCY = 8
+# Gmail per-user quota, and the cost of one messages.get call
+QUOTA_UNITS_PER_SECOND = 250
+MESSAGE_GET_UNITS = 5
+# Units that may be spent at once: one full window of concurrent batches.
+# A single batch costs 500 units, more than a second of quota, so a
+# bucket capped at the per-second rate would serialize the batches.
+QUOTA_BURST_UNITS = BATCH_SIZE * MESSAGE_GET_UNITS * FETCH_CONCURRENCY
+# Retries for a message fetched individually after its batch entry failed
+RETRY_ATTEMPTS = 3
+# Threads fetching messages one by one when batching fails
+PARALLEL_FETCH_WORKERS = 10
+# Headers needed to filter an email before its body is downloaded
+FILTER_HEADERS = ['From', 'Subject', 'Date']
+# Partial-response masks: only the parts of a message the parser reads
+FULL_MESSAGE_FIELDS = 'id,internalDate,payload(mimeType,headers,body,parts)'
+METADATA_FIELDS = 'id,payload/headers'
+
+class RateLimiter:
+    """Token bucket shared by threads spending Gmail quota units."""
+    def __init__(self, rate=QUOTA_UNITS_PER_SECOND, burst=QUOTA_BURST_UNITS):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, units):
+        """Reserve quota units, sleeping until the bucket can cover them."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= units
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
 
 class GmailService:
-    def __init__(self, token_file='token.pickle', credentials_file='credentials.json'):
+    def __init__(self, token_file='token.json', credentials_file='credentials.json'):
         self.service = None
         self.creds = None
         self.token_file = token_file
         self.credentials_file = credentials_file
+        self.rate_limiter = RateLimiter()
+        self.history_id = None
+        # Whether the last listing applied the search query; the history
+        # API can't filter, so incremental syncs return every new email
+        self.query_applied = False
+        # IDs that returned 404: deleted since they were listed, so they
+        # will never be fetched and shouldn't count as failures
+        self.missing_ids = set()
         
     def authenticate(self, scopes):
         """Authenticate and create Gmail service instance."""
@@ -20,15 +75,18 @@ class GmailService:
         
         self.creds = None
         
+        # Convert a token saved by older versions in pickle format
+        migrate_pickle_token(self.token_file)
+        
         # Check for existing token
-        if os.path.exists(self.token_file):
-            try:
-                with open(self.token_file, 'rb') as token:
-                    self.creds = pickle.load(token)
-                print(f"✓ Loaded existing token from {self.token_file}")
-            except Exception as e:
-                print(f"Error loading token: {e}")
-                os.remove(self.token_file)
+        try:
+            self.creds = Credentials.from_authorized_user_info(read_json(self.token_file), scopes)
+            print(f"✓ Loaded existing token from {self.token_file}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading token: {e}")
+            os.remove(self.token_file)
                 
         # If no valid credentials, let user log in
         if not self.creds or not self.creds.valid:
@@ -36,6 +94,8 @@ class GmailService:
                 print("Refreshing expired token...")
                 try:
                     self.creds.refresh(Request())
+                    # Keep the new access token so the next run needn't refresh
+                    save_token(self.creds, self.token_file)
                 except Exception as e:
                     print(f"Error refreshing token: {e}")
                     self.creds = None
@@ -54,8 +114,7 @@ class GmailService:
                     self.creds = flow.run_local_server(port=0)
                     
                     # Save credentials
-                    with open(self.token_file, 'wb') as token:
-                        pickle.dump(self.creds, token)
+                    save_token(self.creds, self.token_file)
                     print(f"✓ Authentication successful! Token saved to {self.token_file}")
                     
                 except Exception as e:
@@ -64,28 +123,100 @@ class GmailService:
         
         # Build service
         try:
-            self.service = build('gmail', 'v1', credentials=self.creds)
+            self.service = build('gmail', 'v1', credentials=self.creds, cache_discovery=False)
             return True
         except Exception as e:
             print(f"✗ Error building Gmail service: {e}")
             return False
     
-    def get_unread_emails(self):
-        """Fetch unread emails from inbox."""
+    def get_unread_emails(self, query=UNREAD_QUERY, start_history_id=None):
+        """Fetch unread emails matching a Gmail search, following every result page.
+        
+        With start_history_id, only messages added since that point are
+        fetched through the history API; the full listing is used on the
+        first run or when Gmail no longer has that history. On success
+        self.history_id holds the id to pass on the next run, and
+        self.query_applied tells whether the query narrowed the result.
+        """
+        self.history_id = None
+        self.query_applied = False
+        if start_history_id:
+            messages = self.get_new_emails(start_history_id)
+            if messages is not None:
+                print(f"Found {len(messages)} new unread emails since last run")
+                return messages
+        
+        messages = []
+        page_token = None
         try:
-            # Search for unread emails
-            results = self.service.users().messages().list(
-                userId='me',
-                q='is:unread in:inbox'
-            ).execute()
+            # Record the mailbox position before listing so nothing added
+            # during the listing is skipped next time
+            history_id = self.service.users().getProfile(
+                userId='me', fields='historyId').execute().get('historyId')
             
-            messages = results.get('messages', [])
+            while True:
+                # Search for unread emails
+                results = self.service.users().messages().list(
+                    userId='me',
+                    q=query,
+                    pageToken=page_token,
+                    fields='messages(id,threadId),nextPageToken'
+                ).execute()
+                
+                messages.extend(results.get('messages', []))
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+            
+            self.history_id = history_id
+            self.query_applied = True
             print(f"Found {len(messages)} unread emails")
             return messages
             
         except HttpError as error:
             print(f'An error occurred: {error}')
-            return []
+            return messages
+    
+    def get_new_emails(self, start_history_id):
+        """Fetch unread inbox messages added since start_history_id.
+        
+        Returns:
+            List of message dicts, or None if the history id has expired
+            and a full listing is needed
+        """
+        messages = []
+        seen = set()
+        page_token = None
+        try:
+            while True:
+                results = self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='UNREAD',
+                    pageToken=page_token,
+                    fields='history(messagesAdded(message(id,threadId,labelIds))),nextPageToken,historyId'
+                ).execute()
+                
+                for record in results.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        message = added['message']
+                        if message['id'] in seen or 'INBOX' not in message.get('labelIds', []):
+                            continue
+                        seen.add(message['id'])
+                        messages.append({'id': message['id'], 'threadId': message.get('threadId')})
+                
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    self.history_id = results.get('historyId', start_history_id)
+                    return messages
+                
+        except HttpError as error:
+            if error.resp.status == 404:
+                print("History expired, listing all unread emails")
+            else:
+                print(f'An error occurred: {error}')
+            return None
     
     def get_email_details(self, msg_id):
         """Get full email details by ID."""
@@ -93,10 +224,167 @@ class GmailService:
             message = self.service.users().messages().get(
                 userId='me',
                 id=msg_id,
-                format='full'
+                format='full',
+                fields=FULL_MESSAGE_FIELDS
             ).execute()
             return message
         except Exception as e:
             print(f"Error getting email {msg_id}: {e}")
             return None
-    
\ No newline at end of file
+
+    def _message_params(self, format, metadata_headers):
+        """Build messages.get keyword arguments for the requested format."""
+        params = {'userId': 'me', 'format': format}
+        if format == 'metadata':
+            params['metadataHeaders'] = metadata_headers or FILTER_HEADERS
+            params['fields'] = METADATA_FIELDS
+        elif format == 'full':
+            params['fields'] = FULL_MESSAGE_FIELDS
+        return params
+    
+    def _execute_batch(self, msg_ids, params, http=None):
+        """Fetch up to BATCH_SIZE messages in one batch HTTP request.
+        
+        Returns:
+            (results, failed): messages by ID, and the IDs whose
+            sub-request failed with a retryable error (typically rate
+            limited), for the caller to pass to _retry_failed
+        """
+        results = {}
+        failed = []
+        
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                return
+            results[request_id] = None
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                print(f"Email {request_id} no longer exists")
+                self.missing_ids.add(request_id)
+            else:
+                failed.append(request_id)
+        
+        batch = self.service.new_batch_http_request(callback=callback)
+        for msg_id in msg_ids:
+            batch.add(
+                self.service.users().messages().get(id=msg_id, **params),
+                request_id=msg_id
+            )
+        try:
+            batch.execute(http=http)
+        except Exception as e:
+            print(f"Error executing batch request: {e}")
+            failed = [msg_id for msg_id in msg_ids if results.get(msg_id) is None]
+        
+        return results, failed
+    
+    def _retry_failed(self, failed, params):
+        """Fetch IDs whose batch entries failed, so one bad message or quota
+        hiccup doesn't sink a whole batch.
+        
+        Called once after all batches finish, so there is never more than
+        one retry pool open.
+        """
+        if len(failed) == 1:
+            return {failed[0]: self._get_message(failed[0], params)}
+        if failed:
+            return self._fetch_parallel(failed, params)
+        return {}
+    
+    def _thread_http(self, local):
+        """Return this thread's authorized connection, creating it on first use.
+        
+        httplib2 is not thread-safe, so every worker thread needs its own.
+        """
+        if not hasattr(local, 'http'):
+            local.http = authorized_http(self.creds)
+        return local.http
+    
+    def _fetch_parallel(self, msg_ids, params, max_workers=PARALLEL_FETCH_WORKERS):
+        """Fetch messages individually on a thread pool."""
+        local = threading.local()
+        
+        def fetch(msg_id):
+            self.rate_limiter.acquire(MESSAGE_GET_UNITS)
+            return self._get_message(msg_id, params, self._thread_http(local))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(msg_ids, executor.map(fetch, msg_ids)))
+    
+    def _get_message(self, msg_id, params, http=None):
+        """Fetch one message on its own, retrying rate-limit and server errors."""
+        try:
+            return self.service.users().messages().get(id=msg_id, **params).execute(
+                http=http, num_retries=RETRY_ATTEMPTS)
+        except HttpError as e:
+            if e.resp.status == 404:
+                print(f"Email {msg_id} no longer exists")
+                self.missing_ids.add(msg_id)
+            else:
+                print(f"Error getting email {msg_id}: {e}")
+            return None
+        except Exception as e:
+            print(f"Error getting email {msg_id}: {e}")
+            return None
+    
+    def get_email_details_batch(self, msg_ids, format='full', metadata_headers=None):
+        """Get email details for many IDs using batched HTTP requests.
+        
+        Args:
+            msg_ids: List of Gmail message IDs
+            format: 'full' for bodies, 'metadata' for headers only
+            metadata_headers: Header names to return when format='metadata'
+            
+        Returns:
+            Dictionary mapping message ID to message, or None if the fetch failed
+        """
+        params = self._message_params(format, metadata_headers)
+        results = {}
+        failed = []
+        for start in range(0, len(msg_ids), BATCH_SIZE):
+            chunk_results, chunk_failed = self._execute_batch(msg_ids[start:start + BATCH_SIZE], params)
+            results.update(chunk_results)
+            failed.extend(chunk_failed)
+        results.update(self._retry_failed(failed, params))
+        return results
+    
+    def get_email_details_many(self, msg_ids, concurrency=FETCH_CONCURRENCY,
+                               format='full', metadata_headers=None):
+        """Get email details by running several batch requests concurrently.
+        
+        Each worker thread gets its own HTTP connection, since httplib2 is
+        not thread-safe, and a shared token bucket keeps the combined
+        request rate under the Gmail per-user quota.
+        
+        Returns:
+            Dictionary mapping message ID to message, or None if the fetch failed
+        """
+        params = self._message_params(format, metadata_headers)
+        chunks = [msg_ids[i:i + BATCH_SIZE] for i in range(0, len(msg_ids), BATCH_SIZE)]
+        if len(chunks) <= 1 or concurrency <= 1:
+            return self.get_email_details_batch(msg_ids, format, metadata_headers)
+        
+        local = threading.local()
+        
+        def fetch(chunk):
+            self.rate_limiter.acquire(len(chunk) * MESSAGE_GET_UNITS)
+            return self._execute_batch(chunk, params, http=self._thread_http(local))
+        
+        results = {}
+        failed = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for chunk_results, chunk_failed in executor.map(fetch, chunks):
+                results.update(chunk_results)
+                failed.extend(chunk_failed)
+        results.update(self._retry_failed(failed, params))
+        return results
+    
+    def get_headers_batch(self, msg_ids, concurrency=FETCH_CONCURRENCY):
+        """Get only the From, Subject and Date headers for many IDs.
+        
+        Returns:
+            Dictionary mapping message ID to a metadata-format message, or
+            None if the fetch failed
+        """
+        return self.get_email_details_many(msg_ids, concurrency,
+                                           format='metadata', metadata_headers=FILTER_HEADERS)
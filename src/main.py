@@ -1,9 +1,9 @@
 import os
-import json
-import re
-from gmail_service import GmailService
+from datetime import datetime
+from gmail_service import GmailService, BATCH_SIZE, FETCH_CONCURRENCY, UNREAD_QUERY
 from sheets_service import SheetsService
-from email_parser import EmailParser
+from email_parser import EmailParser, KeywordMatcher
+from config_cache import get_config, is_valid_date, read_json, write_json
 
 # If modifying these scopes, delete the token.json file.
 SCOPES = [
@@ -15,9 +15,16 @@ SCOPES = [
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CREDENTIALS_FILE = os.path.join(PROJECT_ROOT, 'credentials', 'credentials.json')
 CONFIG_FILE = os.path.join(PROJECT_ROOT, 'config.json')
-STATE_FILE = os.path.join(PROJECT_ROOT, 'state.json')
-TOKEN_FILE = os.path.join(PROJECT_ROOT, 'token.pickle')
+STATE_FILE = os.path.join(PROJECT_ROOT, 'state.ids')
+LEGACY_STATE_FILE = os.path.join(PROJECT_ROOT, 'state.json')
+TOKEN_FILE = os.path.join(PROJECT_ROOT, 'token.json')
 SHEET_NAME = 'Gmail Email Logs'
+# Messages fetched per processing window (several concurrent batches)
+FETCH_WINDOW = BATCH_SIZE * FETCH_CONCURRENCY
+# Rows buffered before they are appended to the sheet in one request
+APPEND_CHUNK_SIZE = 500
+# Seconds the server-side date range is widened past the filter bounds
+QUERY_DATE_SLACK = 24 * 60 * 60
 
 # Filter configuration
 class FilterConfig:
@@ -27,6 +34,11 @@ class FilterConfig:
         self.sender_domains = []
         self.min_date = None
         self.max_date = None
+        self._subject_matcher = KeywordMatcher([])
+        self._domains_lower = frozenset()
+        self._min_ts = None
+        self._max_ts = None
+        self._checks = []
         
     def load_from_config(self, config_data):
         """Load filter settings from config."""
@@ -38,44 +50,133 @@ class FilterConfig:
         self.min_date = filter_settings.get('min_date')
         self.max_date = filter_settings.get('max_date')
         
+        # Build matchers once here instead of for every email
+        self._subject_matcher = KeywordMatcher(self.subject_keywords)
+        self._domains_lower = frozenset(d.lower().lstrip('@') for d in self.sender_domains)
+        self._min_ts = self._date_to_timestamp(self.min_date)
+        self._max_ts = self._date_to_timestamp(self.max_date)
+        
+        # Keep only the checks this configuration needs, so the per-email
+        # loop never tests which options are set. Subject and domain checks
+        # also label matches, so they stay even when filtering is disabled.
+        self._checks = []
+        if self._subject_matcher:
+            self._checks.append(self._check_subject)
+        if self._domains_lower:
+            self._checks.append(self._check_domain)
+        if self.enable_filtering and (self._min_ts is not None or self._max_ts is not None):
+            self._checks.append(self._check_date)
+        
         return self
     
-    def should_process_email(self, email_data):
-        """Check if email should be processed based on filters."""
+    def domain_allowed(self, domain):
+        """Check a lowercased sender domain or one of its parents is allowed.
+        
+        Walks 'mail.acme.com' -> 'acme.com' -> 'com', so each check is a few
+        set lookups regardless of how many domains are configured.
+        """
+        while domain:
+            if domain in self._domains_lower:
+                return True
+            domain = domain.partition('.')[2]
+        return False
+    
+    def to_gmail_query(self):
+        """Build a Gmail search query that narrows the listing server-side.
+        
+        Only the date range is pushed: it is widened by a day so it always
+        returns a superset of what the client-side checks accept. Subject
+        and domain stay client-side, since Gmail's subject: matches whole
+        words while the keyword check matches substrings.
+        """
+        query = UNREAD_QUERY
         if not self.enable_filtering:
-            return True
-            
-        # Subject filtering
-        if self.subject_keywords:
-            subject_lower = email_data['subject'].lower()
-            if not any(keyword.lower() in subject_lower for keyword in self.subject_keywords):
-                return False
+            return query
         
-        # Sender domain filtering
-        if self.sender_domains:
-            from_email = email_data['from']
-            domain = from_email.split('@')[-1] if '@' in from_email else ''
-            if domain and domain.lower() not in [d.lower() for d in self.sender_domains]:
-                return False
+        # Gmail dates by receipt, the date check by the Date header
+        if self._min_ts is not None:
+            query += f' after:{self._min_ts - QUERY_DATE_SLACK}'
+        if self._max_ts is not None:
+            query += f' before:{self._max_ts + QUERY_DATE_SLACK}'
         
-        # Date filtering
-        if self.min_date or self.max_date:
-            try:
-                email_date = datetime.strptime(email_data['date'], '%Y-%m-%d %H:%M:%S')
-                
-                if self.min_date:
-                    min_date = datetime.strptime(self.min_date, '%Y-%m-%d')
-                    if email_date < min_date:
-                        return False
-                
-                if self.max_date:
-                    max_date = datetime.strptime(self.max_date, '%Y-%m-%d')
-                    if email_date > max_date:
-                        return False
-            except:
-                pass  # If date parsing fails, skip date filtering
+        return query
+    
+    def can_filter_out(self, query_applied=False):
+        """Return True if the filters may reject emails the listing returned.
+        
+        With query_applied, Gmail already narrowed the listing to the date
+        range widened by QUERY_DATE_SLACK, so only the subject and domain
+        checks count. Emails in that extra margin are still downloaded in
+        full and then rejected by _check_date; for a date-only filter that
+        costs less than a metadata pass over every listed email.
+        """
+        if not self.enable_filtering:
+            return False
+        if query_applied:
+            return bool(self._subject_matcher or self._domains_lower)
+        return bool(self._checks)
+    
+    def should_process_email(self, email_data):
+        """Check if email should be processed based on filters.
         
-        return True
+        Expects the dict from EmailParser.parse_headers; only header fields
+        are used, so this can run before the body is parsed.
+        """
+        return self.classify(email_data)[0]
+    
+    def classify(self, email_data):
+        """Run the filters once, returning whether the email passes and a label.
+        
+        Returns:
+            (passes, label) where label names the matched filters, or is
+            'No filter match'; label is None for filtered-out emails
+        """
+        matches = []
+        for check in self._checks:
+            passed, label = check(email_data)
+            if not passed and self.enable_filtering:
+                return False, None
+            if label:
+                matches.append(label)
+        return True, ', '.join(matches) if matches else 'No filter match'
+    
+    def _check_subject(self, email_data):
+        """Subject filtering."""
+        keyword = self._subject_matcher.search(email_data['_subject_lc'])
+        if keyword is None:
+            return False, None
+        return True, f"Subject: {keyword}"
+    
+    def _check_domain(self, email_data):
+        """Sender domain filtering."""
+        from_lower = email_data['_from_lc']
+        if '@' not in from_lower:
+            return True, None
+        if not self.domain_allowed(from_lower.rpartition('@')[2]):
+            return False, None
+        return True, f"Domain: {email_data['from'].rpartition('@')[2]}"
+    
+    def _check_date(self, email_data):
+        """Date filtering."""
+        timestamp = email_data['_ts']
+        if timestamp is None:
+            return True, None  # If date parsing fails, skip date filtering
+        if self._min_ts is not None and timestamp < self._min_ts:
+            return False, None
+        if self._max_ts is not None and timestamp > self._max_ts:
+            return False, None
+        return True, None
+    
+    @staticmethod
+    def _date_to_timestamp(date_string):
+        """Convert a YYYY-MM-DD filter bound to a Unix timestamp at local midnight."""
+        if not date_string:
+            return None
+        try:
+            return int(datetime.strptime(date_string, '%Y-%m-%d').timestamp())
+        except ValueError:
+            print(f"⚠️  Ignoring invalid filter date: {date_string}")
+            return None
 
 class GmailToSheets:
     def __init__(self):
@@ -83,37 +184,71 @@ class GmailToSheets:
         self.sheets_service = SheetsService(TOKEN_FILE, CREDENTIALS_FILE)
         self.filter_config = FilterConfig()
         self.processed_ids = self.load_state()
+        # IDs processed this run that are not yet appended to the state file
+        self._new_ids = set()
+        self.last_history_id = None
         
     def load_state(self):
-        """Load processed email IDs from state file."""
-        if os.path.exists(STATE_FILE):
-            try:
-                with open(STATE_FILE, 'r') as f:
-                    data = json.load(f)
-                    return set(data.get('processed_ids', []))
-            except:
-                print("Creating new state file...")
-                return set()
+        """Load processed email IDs from state file (one ID per line)."""
+        try:
+            with open(STATE_FILE, 'rb') as f:
+                return set(f.read().decode().split())
+        except FileNotFoundError:
+            pass
+        if os.path.exists(LEGACY_STATE_FILE):
+            return self.migrate_json_state()
+        print("Creating new state file...")
         return set()
     
+    def migrate_json_state(self):
+        """Convert the old state.json into the append-only state file.
+        
+        Returns:
+            Set of processed email IDs read from state.json
+        """
+        try:
+            ids = set(read_json(LEGACY_STATE_FILE).get('processed_ids', []))
+            with open(STATE_FILE, 'w') as f:
+                f.writelines(f"{msg_id}\n" for msg_id in ids)
+            os.remove(LEGACY_STATE_FILE)
+            print(f"✓ Migrated {len(ids)} processed IDs from state.json")
+            return ids
+        except Exception as e:
+            print(f"⚠️  Could not migrate state.json: {e}")
+            return set()
+    
+    def mark_processed(self, msg_ids):
+        """Record email IDs as processed."""
+        for msg_id in msg_ids:
+            if msg_id not in self.processed_ids:
+                self.processed_ids.add(msg_id)
+                self._new_ids.add(msg_id)
+    
     def save_state(self):
-        """Save processed email IDs to state file."""
-        with open(STATE_FILE, 'w') as f:
-            json.dump({'processed_ids': list(self.processed_ids)}, f)
+        """Append the IDs processed this run to the state file."""
+        # Only new IDs are written, so saving costs O(new) rather than O(all)
+        if not self._new_ids:
+            return
+        with open(STATE_FILE, 'a') as f:
+            f.write('\n'.join(self._new_ids) + '\n')
+        self._new_ids.clear()
     
     def load_config(self):
         """Load configuration including filters."""
         config_data = {}
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r') as f:
-                    config_data = json.load(f)
-            except Exception as e:
-                print(f"⚠️  Error reading config: {e}")
+        try:
+            config_data = get_config(CONFIG_FILE)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Error reading config: {e}")
         
         # Load filter settings
         self.filter_config.load_from_config(config_data)
         
+        # Mailbox position reached by the previous run, for incremental sync
+        self.last_history_id = config_data.get('last_history_id')
+        
         # Return spreadsheet ID
         return config_data.get('spreadsheet_id')
     
@@ -130,8 +265,18 @@ class GmailToSheets:
                 'max_date': filters.get('max_date')
             }
         
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config_data, f, indent=2)
+        write_json(CONFIG_FILE, config_data)
+    
+    def save_history_id(self, history_id):
+        """Record the Gmail history id reached, keeping the rest of the config."""
+        try:
+            config_data = dict(get_config(CONFIG_FILE))
+        except Exception as e:
+            print(f"⚠️  Error reading config: {e}")
+            return
+        config_data['last_history_id'] = history_id
+        write_json(CONFIG_FILE, config_data)
+        self.last_history_id = history_id
     
     def authenticate(self):
         """Authenticate both services."""
@@ -141,34 +286,44 @@ class GmailToSheets:
             return False
         return True
     
-    def validate_spreadsheet(self, spreadsheet_id):
-        """Validate that we can access the spreadsheet."""
+    def validate_spreadsheet(self, meta):
+        """Validate that we can access the spreadsheet.
+        
+        Args:
+            meta: Result of SheetsService.get_spreadsheet_meta
+        """
         print(f"\nValidating spreadsheet access...")
         try:
-            sheets = self.sheets_service.get_sheets(spreadsheet_id)
-            if not sheets:
+            if not meta or not meta['sheet_ids']:
                 print("✗ Spreadsheet appears to be empty or inaccessible")
                 return False
             
+            sheets = list(meta['sheet_ids'])
+            for title, sheet_id in meta['sheet_ids'].items():
+                print(f"  - '{title}' (ID: {sheet_id})")
             print(f"✓ Found {len(sheets)} sheet(s) in spreadsheet")
             
             # Check if our target sheet exists
-            sheet_exists = SHEET_NAME in sheets
-            if sheet_exists:
+            if SHEET_NAME in meta['sheet_names']:
                 print(f"✓ Target sheet '{SHEET_NAME}' exists")
             else:
                 print(f"✗ Target sheet '{SHEET_NAME}' not found. Available sheets: {sheets}")
                 # Try with any sheet name
-                if sheets:
-                    print(f"  Will try to use first available sheet: '{sheets[0]}'")
+                print(f"  Will try to use first available sheet: '{sheets[0]}'")
             
             return True
         except Exception as e:
             print(f"✗ Spreadsheet validation failed: {e}")
             return False
     
-    def ensure_sheet_setup(self, spreadsheet_id, sheet_name=None):
-        """Ensure sheet exists and has headers."""
+    def ensure_sheet_setup(self, spreadsheet_id, meta, sheet_name=None):
+        """Ensure sheet exists and has headers.
+        
+        Args:
+            spreadsheet_id: Target spreadsheet
+            meta: Result of SheetsService.get_spreadsheet_meta
+            sheet_name: Sheet to set up, SHEET_NAME by default
+        """
         if sheet_name is None:
             sheet_name = SHEET_NAME
             
@@ -176,21 +331,16 @@ class GmailToSheets:
         
         try:
             # Check if sheet exists
-            if not self.sheets_service.sheet_exists(spreadsheet_id, sheet_name):
+            if sheet_name not in meta['sheet_names']:
                 print(f"  Creating sheet '{sheet_name}'...")
                 if not self.sheets_service.create_sheet(spreadsheet_id, sheet_name):
                     return False
             
-            # Always ensure headers are present
+            # Always ensure headers are present; a successful write also
+            # shows the sheet is writable, so no separate append test
             headers = ['Date & Time', 'From', 'Subject', 'Content', 'Filter Match']
             if not self.sheets_service.add_headers(spreadsheet_id, sheet_name, headers):
-                print(f"  Warning: Could not add headers to '{sheet_name}'")
-            
-            # Test with a dummy row
-            print(f"  Testing append functionality...")
-            test_success = self.sheets_service.test_append(spreadsheet_id, sheet_name)
-            if not test_success:
-                print(f"  ✗ Append test failed for '{sheet_name}'")
+                print(f"  ✗ Could not write headers to '{sheet_name}'")
                 return False
             
             print(f"✓ Sheet '{sheet_name}' is ready")
@@ -200,29 +350,34 @@ class GmailToSheets:
             print(f"✗ Error setting up sheet: {e}")
             return False
     
-    def extract_filter_matches(self, email_data):
-        """Extract which filter matched the email."""
-        matches = []
-        
-        # Check subject keywords
-        if self.filter_config.subject_keywords:
-            subject_lower = email_data['subject'].lower()
-            for keyword in self.filter_config.subject_keywords:
-                if keyword.lower() in subject_lower:
-                    matches.append(f"Subject: {keyword}")
-                    break
-        
-        # Check sender domains
-        if self.filter_config.sender_domains:
-            from_email = email_data['from']
-            domain = from_email.split('@')[-1] if '@' in from_email else ''
-            if domain:
-                for allowed_domain in self.filter_config.sender_domains:
-                    if domain.lower() == allowed_domain.lower():
-                        matches.append(f"Domain: {domain}")
-                        break
-        
-        return ', '.join(matches) if matches else 'No filter match'
+    def screen_headers(self, msg_ids):
+        """Filter emails on their headers before downloading bodies.
+        
+        Returns:
+            Dictionary mapping message ID to (email_data, passes, filter_matches)
+            for every email whose headers were fetched
+        """
+        screened = {}
+        for msg_id, message in self.gmail_service.get_headers_batch(msg_ids).items():
+            if message:
+                email_data = EmailParser.parse_headers(message)
+                screened[msg_id] = (email_data, *self.filter_config.classify(email_data))
+        return screened
+    
+    def append_rows(self, spreadsheet_id, sheet_name, rows, msg_ids):
+        """Append queued rows in one request and mark the written emails processed.
+        
+        Returns:
+            Number of rows the Sheets API reports as written
+        """
+        appended = self.sheets_service.append_data_bulk(spreadsheet_id, sheet_name, rows)
+        # Rows are written in order, so the first `appended` ids made it
+        self.mark_processed(msg_ids[:appended])
+        if appended < len(rows):
+            print(f"  ✗ Failed to append {len(rows) - appended} of {len(rows)} email(s)")
+        else:
+            print(f"  ✓ Appended {appended} email(s) to '{sheet_name}'")
+        return appended
     
     def process_emails(self, spreadsheet_id):
         print(f"\n{'='*60}")
@@ -246,94 +401,140 @@ class GmailToSheets:
         
         print(f"{'='*60}")
         
+        # Read the sheet list once and share it with validation and setup
+        meta = self.sheets_service.get_spreadsheet_meta(spreadsheet_id)
+        
         # First validate spreadsheet access
-        if not self.validate_spreadsheet(spreadsheet_id):
+        if not self.validate_spreadsheet(meta):
             return
         
-        # Get all available sheets
-        sheets = self.sheets_service.get_sheets(spreadsheet_id)
-        
         # Determine which sheet to use
         target_sheet = SHEET_NAME
-        if SHEET_NAME not in sheets and sheets:
-            print(f"\n⚠️  '{SHEET_NAME}' not found. Using first available sheet: '{sheets[0]}'")
-            target_sheet = sheets[0]
+        if SHEET_NAME not in meta['sheet_names']:
+            target_sheet = next(iter(meta['sheet_ids']))
+            print(f"\n⚠️  '{SHEET_NAME}' not found. Using first available sheet: '{target_sheet}'")
         
         # Ensure sheet is set up
-        if not self.ensure_sheet_setup(spreadsheet_id, target_sheet):
+        if not self.ensure_sheet_setup(spreadsheet_id, meta, target_sheet):
             print("✗ Failed to setup sheet. Cannot process emails.")
             return
         
-        # Get unread emails
-        messages = self.gmail_service.get_unread_emails()
+        # Get unread emails, letting Gmail apply the filters server-side
+        messages = self.gmail_service.get_unread_emails(
+            self.filter_config.to_gmail_query(), self.last_history_id)
+        history_id = self.gmail_service.history_id
         
         if not messages:
             print("No unread emails found")
+            if history_id:
+                self.save_history_id(history_id)
             return
         
         print(f"\nFound {len(messages)} unread emails")
         
-        # Process each email
+        # Drop already processed emails once, up front
+        unprocessed = [m for m in messages if m['id'] not in self.processed_ids]
+        skipped = len(messages) - len(unprocessed)
+        if skipped:
+            print(f"Skipping {skipped} already processed email(s)")
+        
+        # Process emails one fetch window at a time
         successful_emails = 0
         filtered_emails = 0
-        for i, message in enumerate(messages, 1):
-            msg_id = message['id']
+        failed_emails = 0
+        pending_rows = []
+        pending_ids = []
+        for start in range(0, len(unprocessed), FETCH_WINDOW):
+            chunk = unprocessed[start:start + FETCH_WINDOW]
             
-            if msg_id in self.processed_ids:
-                print(f"  [{i}/{len(messages)}] Skipped (already processed): {msg_id[:10]}...")
-                continue
+            fetch_ids = [m['id'] for m in chunk]
             
-            print(f"  [{i}/{len(messages)}] Processing: {msg_id[:10]}...")
+            # When the filters can still reject listed emails, fetch headers
+            # first so full messages are only downloaded for emails that pass
+            screened = {}
+            if fetch_ids and self.filter_config.can_filter_out(self.gmail_service.query_applied):
+                screened = self.screen_headers(fetch_ids)
+                missing_ids = self.gmail_service.missing_ids
+                fetch_ids = [msg_id for msg_id in fetch_ids
+                             if msg_id not in missing_ids
+                             and (msg_id not in screened or screened[msg_id][1])]
             
-            # Get email details
-            email_message = self.gmail_service.get_email_details(msg_id)
+            # Fetch details for the window with concurrent batch requests
+            details = self.gmail_service.get_email_details_many(fetch_ids) if fetch_ids else {}
             
-            if not email_message:
-                print(f"     ✗ Failed to fetch email details")
-                continue
-            
-            # Parse email with HTML conversion
-            email_data = EmailParser.parse_email(email_message)
-            
-            if not email_data:
-                print(f"     ✗ Failed to parse email")
-                continue
-            
-            # Apply filters
-            if not self.filter_config.should_process_email(email_data):
-                print(f"     ⚡ Filtered out: {email_data['subject'][:50]}...")
-                filtered_emails += 1
+            for i, message in enumerate(chunk, start + 1):
+                msg_id = message['id']
+                print(f"  [{i}/{len(unprocessed)}] Processing: {msg_id[:10]}...")
                 
-                self.processed_ids.add(msg_id)
-                continue
-            
-            # Extract filter matches for logging
-            filter_matches = self.extract_filter_matches(email_data)
-            
-            # Append to sheet
-            values = [
-                email_data['date'],
-                email_data['from'],
-                email_data['subject'],
-                email_data['body'],
-                filter_matches
-            ]
-            
-            success = self.sheets_service.append_data(spreadsheet_id, target_sheet, values)
-            
-            if success:
-                # Add to processed IDs
-                self.processed_ids.add(msg_id)
-                successful_emails += 1
-                print(f"     ✓ Appended email from {email_data['from']}")
+                email_message = details.get(msg_id)
+                
+                # Deleted since it was listed; it will never be fetched, so
+                # don't let it hold back the history position
+                if msg_id in self.gmail_service.missing_ids:
+                    print(f"     ⚡ Skipped: email no longer exists")
+                    self.mark_processed((msg_id,))
+                    continue
+                
+                if msg_id in screened:
+                    email_data, passes, filter_matches = screened[msg_id]
+                elif email_message:
+                    # Parse headers only; the body is decoded after filtering
+                    email_data = EmailParser.parse_headers(email_message)
+                    
+                    # Apply filters and label the match in a single pass
+                    passes, filter_matches = self.filter_config.classify(email_data)
+                else:
+                    print(f"     ✗ Failed to fetch email details")
+                    failed_emails += 1
+                    continue
+                
+                if not passes:
+                    print(f"     ⚡ Filtered out: {email_data['subject'][:50]}...")
+                    filtered_emails += 1
+                
+                    self.mark_processed((msg_id,))
+                    continue
+                
+                if not email_message:
+                    print(f"     ✗ Failed to fetch email details")
+                    failed_emails += 1
+                    continue
+                
+                # Parse body with HTML conversion
+                email_data.update(EmailParser.parse_body(email_message))
+                
+                # Queue row for the next bulk append
+                pending_rows.append([
+                    email_data['date'],
+                    email_data['from'],
+                    email_data['subject'],
+                    email_data['body'],
+                    filter_matches
+                ])
+                pending_ids.append(msg_id)
+                print(f"     ✓ Queued email from {email_data['from']}")
                 if filter_matches != 'No filter match':
                     print(f"       Filter match: {filter_matches}")
-            else:
-                print(f"     ✗ Failed to append email")
+                
+                if len(pending_rows) >= APPEND_CHUNK_SIZE:
+                    appended = self.append_rows(spreadsheet_id, target_sheet, pending_rows, pending_ids)
+                    successful_emails += appended
+                    failed_emails += len(pending_rows) - appended
+                    pending_rows, pending_ids = [], []
+        
+        if pending_rows:
+            appended = self.append_rows(spreadsheet_id, target_sheet, pending_rows, pending_ids)
+            successful_emails += appended
+            failed_emails += len(pending_rows) - appended
         
         # Save state
         self.save_state()
         
+        # Only move the sync position forward once every email was handled,
+        # otherwise failed ones would never be listed again
+        if history_id and not failed_emails:
+            self.save_history_id(history_id)
+        
         print(f"\n{'='*60}")
         print(f"Processing complete!")
         print(f"✓ Successfully processed {successful_emails} new emails")
@@ -392,7 +593,7 @@ class GmailToSheets:
         min_date = input("Start date (YYYY-MM-DD): ").strip()
         if min_date:
             # Validate date format
-            if re.match(r'\d{4}-\d{2}-\d{2}', min_date):
+            if is_valid_date(min_date):
                 filters['min_date'] = min_date
                 print(f"  Start date: {min_date}")
             else:
@@ -400,7 +601,7 @@ class GmailToSheets:
         
         max_date = input("End date (YYYY-MM-DD): ").strip()
         if max_date:
-            if re.match(r'\d{4}-\d{2}-\d{2}', max_date):
+            if is_valid_date(max_date):
                 filters['max_date'] = max_date
                 print(f"  End date: {max_date}")
             else:
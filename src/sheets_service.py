@@ -1,17 +1,37 @@
 import os
-import pickle
+import time
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from auth_utils import migrate_pickle_token, save_token
+from config_cache import read_json
+
+# Seconds a spreadsheet's sheet list is reused before it is fetched again
+SHEET_CACHE_TTL = 60
+
+def _column_letter(index):
+    """Convert a 1-based column number to its A1 letters (1 -> A, 27 -> AA)."""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def _quote_range(sheet_name, a1):
+    """Build an A1 range on a sheet, quoting the name (quotes doubled)."""
+    quoted = sheet_name.replace("'", "''")
+    return f"'{quoted}'!{a1}"
 
 class SheetsService:
-    def __init__(self, token_file='token.pickle', credentials_file='credentials.json'):
+    def __init__(self, token_file='token.json', credentials_file='credentials.json'):
         self.service = None
         self.creds = None
         self.token_file = token_file
         self.credentials_file = credentials_file
+        # Sheet metadata per spreadsheet: spreadsheet_id -> (fetched_at, meta)
+        self._sheet_cache = {}
         
     def authenticate(self, scopes):
         """Authenticate and create Sheets service instance."""
@@ -20,15 +40,18 @@ class SheetsService:
         
         self.creds = None
         
+        # Convert a token saved by older versions in pickle format
+        migrate_pickle_token(self.token_file)
+        
         # Check for existing token
-        if os.path.exists(self.token_file):
-            try:
-                with open(self.token_file, 'rb') as token:
-                    self.creds = pickle.load(token)
-                print(f"✓ Loaded existing token from {self.token_file}")
-            except Exception as e:
-                print(f"Error loading token: {e}")
-                os.remove(self.token_file)
+        try:
+            self.creds = Credentials.from_authorized_user_info(read_json(self.token_file), scopes)
+            print(f"✓ Loaded existing token from {self.token_file}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading token: {e}")
+            os.remove(self.token_file)
                 
         # If no valid credentials, let user log in
         if not self.creds or not self.creds.valid:
@@ -36,6 +59,8 @@ class SheetsService:
                 print("Refreshing expired token...")
                 try:
                     self.creds.refresh(Request())
+                    # Keep the new access token so the next run needn't refresh
+                    save_token(self.creds, self.token_file)
                 except Exception as e:
                     print(f"Error refreshing token: {e}")
                     self.creds = None
@@ -54,8 +79,7 @@ class SheetsService:
                     self.creds = flow.run_local_server(port=0)
                     
                     # Save credentials
-                    with open(self.token_file, 'wb') as token:
-                        pickle.dump(self.creds, token)
+                    save_token(self.creds, self.token_file)
                     print(f"✓ Authentication successful! Token saved to {self.token_file}")
                     
                 except Exception as e:
@@ -64,7 +88,7 @@ class SheetsService:
         
         # Build service
         try:
-            self.service = build('sheets', 'v4', credentials=self.creds)
+            self.service = build('sheets', 'v4', credentials=self.creds, cache_discovery=False)
             return True
         except Exception as e:
             print(f"✗ Error building Sheets service: {e}")
@@ -116,11 +140,14 @@ class SheetsService:
                 }]
             }
             
-            response = self.service.spreadsheets().batchUpdate(
+            self.service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                body=batch_update_request
+                body=batch_update_request,
+                fields='spreadsheetId'
             ).execute()
             
+            # The cached sheet list no longer includes the new sheet
+            self._sheet_cache.pop(spreadsheet_id, None)
             print(f"✓ Created new sheet: '{sheet_name}'")
             return True
             
@@ -131,11 +158,8 @@ class SheetsService:
     def add_headers(self, spreadsheet_id, sheet_name, headers):
         """Add headers to a sheet."""
         try:
-            # Properly format range for sheet names with spaces
-            if ' ' in sheet_name or "'" in sheet_name or '!' in sheet_name:
-                range_name = f"'{sheet_name}'!A1:D1"
-            else:
-                range_name = f"{sheet_name}!A1:D1"
+            # One column per header
+            range_name = _quote_range(sheet_name, f"A1:{_column_letter(len(headers))}1")
                 
             body = {
                 'values': [headers]
@@ -145,7 +169,8 @@ class SheetsService:
                 spreadsheetId=spreadsheet_id,
                 range=range_name,
                 valueInputOption='RAW',
-                body=body
+                body=body,
+                fields='updatedRange'
             ).execute()
             print(f"✓ Added headers to '{sheet_name}'")
             return True
@@ -156,11 +181,8 @@ class SheetsService:
     def append_data(self, spreadsheet_id, sheet_name, data):
         """Append data to a sheet."""
         try:
-            # Properly format range for sheet names with spaces
-            if ' ' in sheet_name or "'" in sheet_name or '!' in sheet_name:
-                range_name = f"'{sheet_name}'!A:D"
-            else:
-                range_name = f"{sheet_name}!A:D"
+            # Cover every column of the row
+            range_name = _quote_range(sheet_name, f"A:{_column_letter(len(data))}")
                 
             body = {
                 'values': [data]
@@ -171,7 +193,8 @@ class SheetsService:
                 range=range_name,
                 valueInputOption='USER_ENTERED',  # Changed to USER_ENTERED for better formatting
                 insertDataOption='INSERT_ROWS',
-                body=body
+                body=body,
+                fields='updates(updatedRange,updatedRows)'
             ).execute()
             
             # Debug: Print what was appended
@@ -187,58 +210,94 @@ class SheetsService:
             print(f'✗ Error appending data: {e}')
             return False
     
+    def append_data_bulk(self, spreadsheet_id, sheet_name, rows):
+        """Append many rows to a sheet in a single request.
+        
+        Returns:
+            Number of rows written, 0 if the request failed
+        """
+        if not rows:
+            return 0
+        
+        try:
+            # Cover every column of the widest row
+            width = max(len(row) for row in rows)
+            range_name = _quote_range(sheet_name, f"A:{_column_letter(width)}")
+                
+            body = {
+                'values': rows
+            }
+            
+            result = self.service.spreadsheets().values().append(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueInputOption='USER_ENTERED',
+                insertDataOption='INSERT_ROWS',
+                body=body,
+                fields='updates(updatedRange,updatedRows)'
+            ).execute()
+            
+            updates = result.get('updates', {})
+            print(f"  ↳ Appended to rows {updates.get('updatedRange', 'unknown')}")
+            
+            return updates.get('updatedRows', len(rows))
+            
+        except HttpError as error:
+            print(f'✗ Sheets API error: {error}')
+            return 0
+        except Exception as e:
+            print(f'✗ Error appending data: {e}')
+            return 0
+    
     def sheet_exists(self, spreadsheet_id, sheet_name):
         """Check if a sheet exists in the spreadsheet."""
+        meta = self.get_spreadsheet_meta(spreadsheet_id)
+        return bool(meta) and sheet_name in meta['sheet_names']
+    
+    def get_spreadsheet_meta(self, spreadsheet_id):
+        """Fetch the sheet titles and IDs of a spreadsheet in one request.
+        
+        The result is reused for SHEET_CACHE_TTL seconds, so repeated
+        sheet_exists and get_sheets calls within a run stay in memory.
+        
+        Returns:
+            Dictionary with 'sheet_names' (frozenset) and 'sheet_ids'
+            (title -> sheetId, in tab order), or None if the spreadsheet
+            can't be read
+        """
+        cached = self._sheet_cache.get(spreadsheet_id)
+        if cached and time.monotonic() - cached[0] < SHEET_CACHE_TTL:
+            return cached[1]
+        
         try:
             spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
+                spreadsheetId=spreadsheet_id,
+                fields='sheets.properties(title,sheetId)'
             ).execute()
             
-            sheets = spreadsheet.get('sheets', [])
-            for sheet in sheets:
-                if sheet['properties']['title'] == sheet_name:
-                    return True
-            return False
-            
+            sheet_ids = {
+                sheet['properties']['title']: sheet['properties']['sheetId']
+                for sheet in spreadsheet.get('sheets', [])
+            }
+            meta = {'sheet_names': frozenset(sheet_ids), 'sheet_ids': sheet_ids}
+            self._sheet_cache[spreadsheet_id] = (time.monotonic(), meta)
+            return meta
         except HttpError as e:
             if e.resp.status == 404:
                 print(f"✗ Spreadsheet not found: {spreadsheet_id}")
             else:
-                print(f"✗ Error checking sheet existence: {e}")
-            return False
+                print(f"✗ Error getting sheets: {e}")
+            return None
         except Exception as e:
-            print(f"✗ Error: {e}")
-            return False
+            print(f"✗ Error getting sheets: {e}")
+            return None
     
     def get_sheets(self, spreadsheet_id):
         """Get all sheets in the spreadsheet."""
-        try:
-            spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
-            
-            sheets = spreadsheet.get('sheets', [])
-            sheet_names = []
-            for sheet in sheets:
-                title = sheet['properties']['title']
-                sheet_names.append(title)
-                print(f"  - '{title}' (ID: {sheet['properties']['sheetId']})")
-            
-            return sheet_names
-        except HttpError as e:
-            print(f"✗ Error getting sheets: {e}")
+        meta = self.get_spreadsheet_meta(spreadsheet_id)
+        if not meta:
             return []
-    
-    def test_append(self, spreadsheet_id, sheet_name):
-        """Test append functionality with simple data."""
-        try:
-            test_data = ['Test Date', 'test@example.com', 'Test Subject', 'Test Content']
-            success = self.append_data(spreadsheet_id, sheet_name, test_data)
-            if success:
-                print(f"✓ Test append successful to '{sheet_name}'")
-            else:
-                print(f"✗ Test append failed to '{sheet_name}'")
-            return success
-        except Exception as e:
-            print(f"✗ Test append error: {e}")
-            return False
\ No newline at end of file
+        
+        for title, sheet_id in meta['sheet_ids'].items():
+            print(f"  - '{title}' (ID: {sheet_id})")
+        return list(meta['sheet_ids'])
\ No newline at end of file